@@ -13,7 +13,7 @@ with st.sidebar.form(key='sidebar_selection_form'):
     st.markdown('## Select your modeling options here')
     model_file = st.selectbox(
         'Select a model',
-        os.listdir(MODEL_PATH)
+        list_models(MODEL_PATH)
         )
     st.markdown('## Select your target metabolite here')
     target_metabolite = st.selectbox(
@@ -26,25 +26,38 @@ with st.sidebar.form(key='sidebar_selection_form'):
         min_value = 50,
         max_value = 10000
     )
+    # A slider needs distinct bounds, single CPU hosts always sample on one process
+    if (os.cpu_count() or 1) > 1:
+        st.markdown('## Select the number of sampling processes here')
+        number_of_processes = st.slider(
+            'Number of processes',
+            min_value = 1,
+            max_value = os.cpu_count(),
+            value = os.cpu_count() - 1
+        )
+    else:
+        number_of_processes = 1
     modeling_options_submitted = st.form_submit_button(label = 'Submit modeling options')
 
 if modeling_options_submitted:
     # 1. Load model
     model_load_state = st.text('Loading metabolic model...')
-    model = get_model(os.path.join(MODEL_PATH, model_file))
+    model_path = os.path.join(MODEL_PATH, model_file)
+    model_key = (model_path, os.path.getmtime(model_path))
+    model = load_model_cached(*model_key).copy()
     model_load_state.text('Loading metabolic model... Done!')    
     # 2. Perform flux sampling
     flux_sampling_state = st.text('Performing flux sampling...')
-    old_objective = 'Ex16'
     new_objective = 'BIO_L'
-    model = change_model_objective(old_objective, new_objective, model)
+    model = change_model_objective(new_objective, model)
     # 2.1 Generate biomass flux samples
-    biomass_samples = run_flux_sampling(model, n_samples=number_of_samples)
+    biomass_samples = run_flux_sampling_cached(model, model_key, new_objective, n_samples=number_of_samples, processes=number_of_processes)
     flux_sampling_state.text('Performing flux sampling... Biomass flux sampling is done!')
-    # 2.2 Generate target flux samples
-    model, new_objective = create_exchange_reaction(model, target_metabolite)
-    model = change_model_objective(old_objective, new_objective, model)
-    target_samples = run_flux_sampling(model, n_samples=50)
+    # 2.2 Generate target flux samples, the exchange reaction and objective are reverted when leaving the context
+    with model:
+        model, target_objective = create_exchange_reaction(model, target_metabolite)
+        model = change_model_objective(target_objective, model)
+        target_samples = run_flux_sampling_cached(model, model_key, target_objective, n_samples=50, processes=1)
     flux_sampling_state.text('Performing flux sampling... Target flux sampling is done!')
     # 3. Perform Kolmogorov-Smirnov test to get distribution of flux samples
     ks_test = perform_ks_test(model, biomass_samples, target_samples)
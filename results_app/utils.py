@@ -1,13 +1,35 @@
+import os
+import threading
+
 import cobra
 from cobra.flux_analysis import production_envelope
 from cobra.util import linear_reaction_coefficients
 from cobra.sampling import sample
 
+import numpy as np
 import pandas as pd
 import scipy as sp
 import matplotlib.pyplot as plt
 import streamlit as st
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+@st.cache_data(ttl=30, show_spinner=False)
+def list_models(path: str) -> list:
+    """
+    List the model files available in a directory, refreshing the listing at most every 30 seconds.
+
+    Args:
+        path (str): The directory containing the models.
+
+    Returns:
+        list: The sorted list of file names in the directory.
+    """
+    return sorted(os.listdir(path))
+
 def get_model(path: str) -> cobra.Model:
     """
     Load a COBRA model from a JSON file.
@@ -27,20 +49,39 @@ def get_model(path: str) -> cobra.Model:
         model = cobra.io.load_json_model(path)
     return model
 
-def change_model_objective(initial_reaction_id: str, new_reaction_id: str, model: cobra.Model) -> cobra.Model:
+@st.cache_resource(show_spinner=False)
+def load_model_cached(path: str, mtime: float) -> cobra.Model:
     """
-    Change the objective of a COBRA model by setting the objective coefficient of the initial reaction to 0 and the objective coefficient of the new reaction to 1.
+    Load a COBRA model from a JSON file once and reuse it across Streamlit reruns.
+
+    The cached model is shared between reruns and sessions, callers must work on a copy of it before modifying it.
+
+    Args:
+        path (str): The path to the JSON file containing the model.
+        mtime (float): The modification time of the file, only used as part of the cache key so that replacing the file invalidates the cached model.
+
+    Returns:
+        cobra.Model: The loaded COBRA model.
+    """
+    return get_model(path)
+
+def change_model_objective(new_reaction_id: str, model: cobra.Model) -> cobra.Model:
+    """
+    Change the objective of a COBRA model to the new reaction with an objective coefficient of 1.
+
+    The whole objective is replaced in a single update, every reaction of the previous objective stops contributing to it.
 
     Args:
-        initial_reaction_id (str): The ID of the initial reaction.
         new_reaction_id (str): The ID of the new reaction.
         model (cobra.Model): The COBRA model.
 
     Returns:
         cobra.Model: The modified COBRA model with the changed objective.
+
+    Raises:
+        KeyError: If the new reaction is not in the model.
     """
-    model.reactions.get_by_id(initial_reaction_id).objective_coefficient = 0
-    model.reactions.get_by_id(new_reaction_id).objective_coefficient = 1
+    model.objective = {model.reactions.get_by_id(new_reaction_id): 1.0}
     return model
 
 def create_exchange_reaction(model: cobra.Model, metabolite_id: str) -> tuple[cobra.Model, str]:
@@ -54,28 +95,142 @@ def create_exchange_reaction(model: cobra.Model, metabolite_id: str) -> tuple[co
     Returns:
         tuple[cobra.Model, str]: A tuple containing the modified COBRA model with the exchange reaction added and the ID of the new exchange reaction.
     """
-    model.add_boundary(model.metabolites.get_by_id(metabolite_id), type="exchange")
-    new_exchange_reaction_id = f"EX_{metabolite_id}"
-    return model, new_exchange_reaction_id
+    new_exchange_reaction = model.add_boundary(model.metabolites.get_by_id(metabolite_id), type="exchange")
+    return model, new_exchange_reaction.id
+
+def set_solver_threads(model: cobra.Model, n_threads: int) -> None:
+    """
+    Set the number of threads used by the solver of a COBRA model.
+
+    Only Gurobi and CPLEX expose a thread setting, other solvers such as GLPK are single-threaded and left untouched.
+
+    Args:
+        model (cobra.Model): The COBRA model whose solver will be configured.
+        n_threads (int): The number of threads the solver is allowed to use.
+
+    Returns:
+        None
+    """
+    solver_interface = type(model.solver).__module__
+    if solver_interface.endswith('gurobi_interface'):
+        model.solver.problem.Params.Threads = n_threads
+    elif solver_interface.endswith('cplex_interface'):
+        model.solver.problem.parameters.threads.set(n_threads)
 
-def run_flux_sampling(model: cobra.Model, n_samples: int=100) -> pd.DataFrame:
+def run_flux_sampling(model: cobra.Model, n_samples: int=100, processes: int=None, method: str='optgp') -> pd.DataFrame:
     """
     Perform flux sampling on the given COBRA model.
 
     Args:
         model (cobra.Model): The COBRA model to sample fluxes from.
         n_samples (int, optional): The number of samples to generate. Defaults to 100.
+        processes (int, optional): The number of processes used by the OptGP sampler. Defaults to all but one of the available CPUs.
+        method (str, optional): The sampling method, either 'optgp' or 'achr'. Defaults to 'optgp'.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the sampled fluxes.
+        pd.DataFrame: A DataFrame containing the sampled fluxes as single precision floats.
     """
-    s = sample(model, n_samples)
+    if processes is None:
+        processes = max(1, (os.cpu_count() or 2) - 1)
+    # The warm-up points are generated by solving LPs, let the solver use the same parallelism
+    set_solver_threads(model, processes)
+    # Single precision is enough for the KS test and the histograms and halves the memory of the samples
+    s = sample(model, n_samples, method=method, processes=processes).astype(np.float32, copy=False)
     return s
 
+@st.cache_data(show_spinner=False, max_entries=8)
+def run_flux_sampling_cached(_model: cobra.Model, model_key: tuple, objective_id: str, n_samples: int=100, processes: int=None, method: str='optgp') -> pd.DataFrame:
+    """
+    Perform flux sampling on the given COBRA model and reuse the samples across Streamlit reruns.
+
+    The model itself is not hashed by Streamlit (leading underscore), the samples are cached on the model file and the objective instead.
+    Only the 8 most recent sample sets are kept since each one can take up to about a hundred megabytes.
+
+    Args:
+        _model (cobra.Model): The COBRA model to sample fluxes from, its objective must already be set to `objective_id`.
+        model_key (tuple): The path and modification time of the file the model was loaded from.
+        objective_id (str): The ID of the objective reaction of the model.
+        n_samples (int, optional): The number of samples to generate. Defaults to 100.
+        processes (int, optional): The number of processes used by the OptGP sampler. Defaults to all but one of the available CPUs.
+        method (str, optional): The sampling method, either 'optgp' or 'achr'. Defaults to 'optgp'.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the sampled fluxes.
+    """
+    return run_flux_sampling(_model, n_samples=n_samples, processes=processes, method=method)
+
+def _ks_2samp_statistics(a1: np.ndarray, a2: np.ndarray, block_elements: int=1 << 20) -> np.ndarray:
+    """
+    Compute the two-sample Kolmogorov-Smirnov statistic for every column of two sample matrices at once.
+
+    Columns are processed in blocks of about `block_elements` samples so that the sorting temporaries stay bounded whatever the size of the matrices.
+
+    Args:
+        a1 (np.ndarray): The first sample matrix of shape (n1, k).
+        a2 (np.ndarray): The second sample matrix of shape (n2, k).
+        block_elements (int, optional): The number of samples processed per block. Defaults to 2**20.
+
+    Returns:
+        np.ndarray: An array of shape (k,) containing the supremum of |F1 - F2| for each column.
+    """
+    n1, n2 = a1.shape[0], a2.shape[0]
+    statistics = np.zeros(a1.shape[1])
+    # Integer steps keep the empirical CDF difference exact: n1 * n2 * (F1 - F2), which fits in int32 for any realistic sample size
+    step_dtype = np.int32 if n1 * n2 < np.iinfo(np.int32).max else np.int64
+    block_size = max(1, block_elements // (n1 + n2))
+    for start in range(0, a1.shape[1], block_size):
+        stop = start + block_size
+        # Work on a (block, n1 + n2) matrix so that every column is sorted and scanned as a contiguous row
+        data_all = np.concatenate([a1[:, start:stop].T, a2[:, start:stop].T], axis=1)
+        order = np.argsort(data_all, axis=1, kind='stable')
+        cdf_diff = np.where(order < n1, step_dtype(n2), step_dtype(-n1))
+        np.cumsum(cdf_diff, axis=1, out=cdf_diff)
+        # With ties, the CDFs are only defined at the last position of each run of equal values
+        sorted_data = np.take_along_axis(data_all, order, axis=1)
+        del data_all, order
+        cdf_diff[:, :-1][sorted_data[:, 1:] == sorted_data[:, :-1]] = 0
+        np.abs(cdf_diff, out=cdf_diff)
+        statistics[start:stop] = cdf_diff.max(axis=1, initial=0)
+    return statistics / (n1 * n2)
+
+if numba is not None:
+    @numba.njit
+    def _ks_2samp_statistics_numba(a1: np.ndarray, a2: np.ndarray) -> np.ndarray:
+        """
+        Compiled equivalent of `_ks_2samp_statistics`, sorting each column and walking both sorted samples once.
+        It runs serially since the OptGP sampler already keeps the cores busy and Streamlit calls it from several session threads.
+
+        Args:
+            a1 (np.ndarray): The first sample matrix of shape (n1, k).
+            a2 (np.ndarray): The second sample matrix of shape (n2, k).
+
+        Returns:
+            np.ndarray: An array of shape (k,) containing the supremum of |F1 - F2| for each column.
+        """
+        n1, n2 = a1.shape[0], a2.shape[0]
+        statistics = np.empty(a1.shape[1])
+        for j in range(a1.shape[1]):
+            s1 = np.sort(a1[:, j])
+            s2 = np.sort(a2[:, j])
+            i1, i2, d = 0, 0, 0
+            # Once one sample is exhausted the CDF difference can only shrink
+            while i1 < n1 and i2 < n2:
+                value = min(s1[i1], s2[i2])
+                while i1 < n1 and s1[i1] <= value:
+                    i1 += 1
+                while i2 < n2 and s2[i2] <= value:
+                    i2 += 1
+                d = max(d, abs(i1 * n2 - i2 * n1))
+            statistics[j] = d / (n1 * n2)
+        return statistics
+
 def perform_ks_test(model: cobra.Model, samples_1: pd.DataFrame, samples_2: pd.DataFrame) -> pd.DataFrame:
     """
     Perform a Kolmogorov-Smirnov test to compare the flux distributions per reaction between two dataframes.
 
+    The statistics of all reactions are computed in a single vectorized pass and the p-values use the asymptotic
+    two-sided distribution of the statistic.
+
     Args:
         model (cobra.Model): The COBRA model containing the reactions.
         samples_1 (pd.DataFrame): The first dataframe containing the flux samples for each reaction.
@@ -84,19 +239,21 @@ def perform_ks_test(model: cobra.Model, samples_1: pd.DataFrame, samples_2: pd.D
     Returns:
         pd.DataFrame: A dataframe containing the reaction ID, the Kolmogorov-Smirnov statistic, and the p-value for each reaction.
     """
-    # Pre-filter the samples
-    samples_1 = samples_1.loc[:, (samples_1 > 1e-3).any(axis=0)]
-    samples_2 = samples_2.loc[:, (samples_2 > 1e-3).any(axis=0)]
-    # Compare the flux distributions per reaction
-    ks_data = []
-    for r in model.reactions:
-        if r.id in samples_1.columns and r.id in samples_2.columns:
-            kstest_result = sp.stats.ks_2samp(samples_1[r.id], samples_2[r.id])
-            ks_data.append([r.id, kstest_result.statistic, kstest_result.pvalue])
-        else:
-            pass
-
-    ks_df = pd.DataFrame(ks_data, columns=['Reaction', 'Statistic', 'P-value'])
+    # Pre-filter the samples on the largest absolute flux per reaction, without building a boolean matrix
+    samples_1 = samples_1.loc[:, np.maximum(samples_1.max(axis=0), -samples_1.min(axis=0)) > 1e-3]
+    samples_2 = samples_2.loc[:, np.maximum(samples_2.max(axis=0), -samples_2.min(axis=0)) > 1e-3]
+    # Compare the flux distributions of the reactions sampled in both dataframes
+    common = samples_1.columns.intersection(samples_2.columns)
+    a1 = samples_1[common].to_numpy()
+    a2 = samples_2[common].to_numpy()
+    n1, n2 = a1.shape[0], a2.shape[0]
+    if numba is not None:
+        statistics = _ks_2samp_statistics_numba(a1, a2)
+    else:
+        statistics = _ks_2samp_statistics(a1, a2)
+    pvalues = sp.stats.kstwo.sf(statistics, round(n1 * n2 / (n1 + n2)))
+
+    ks_df = pd.DataFrame({'Reaction': common, 'Statistic': statistics, 'P-value': pvalues})
     return ks_df
 
 def get_top_hits(ks_df: pd.DataFrame, n_hits: int=10) -> pd.DataFrame:
@@ -112,6 +269,23 @@ def get_top_hits(ks_df: pd.DataFrame, n_hits: int=10) -> pd.DataFrame:
     """
     return ks_df.sort_values(by='P-value', ascending=False).head(n_hits)
 
+@st.cache_resource(show_spinner=False)
+def _make_figure(nrows: int, ncols: int) -> tuple:
+    """
+    Create a grid of axes once and reuse it across Streamlit reruns.
+
+    The figure is shared by every session, it must only be drawn while holding the returned lock since matplotlib figures are not thread-safe.
+
+    Args:
+        nrows (int): The number of rows of the grid.
+        ncols (int): The number of columns of the grid.
+
+    Returns:
+        tuple: The matplotlib figure, its array of axes and the lock guarding them.
+    """
+    fig, axs = plt.subplots(nrows, ncols, figsize=(10, 10))
+    return fig, axs, threading.Lock()
+
 def plot_distribution(selected_reactions: list, samples_1, samples_2) -> None:
     """
     Plot the distribution of samples for the top 10 reactions with the lowest p-values.
@@ -126,13 +300,22 @@ def plot_distribution(selected_reactions: list, samples_1, samples_2) -> None:
     """
     ncols=3
     nrows=len(selected_reactions)//ncols
-    fig, axs = plt.subplots(nrows, ncols, figsize=(10, 10))
+    fig, axs, lock = _make_figure(nrows, ncols)
+    a1 = samples_1[selected_reactions].to_numpy()
+    a2 = samples_2[selected_reactions].to_numpy()
+    lows = np.minimum(a1.min(axis=0), a2.min(axis=0))
+    highs = np.maximum(a1.max(axis=0), a2.max(axis=0))
     
-    for r, ax in zip(selected_reactions, axs.flat):
-        ax.hist(samples_1[r], bins=20, alpha=0.5, label='Biomass')
-        ax.hist(samples_2[r], bins=20, alpha=0.5, label='Cellulose')
-        ax.set_title(r)
-        ax.legend()
-
-    plt.tight_layout()
-    st.pyplot(fig)
+    # Other sessions draw on the same cached figure, keep it to ourselves until it is rendered
+    with lock:
+        for j, (r, ax) in enumerate(zip(selected_reactions, axs.flat)):
+            ax.cla()
+            # Both distributions share the same bins so that they can be compared
+            edges = np.histogram_bin_edges(a1[:, j], bins=20, range=(lows[j], highs[j]))
+            ax.stairs(np.histogram(a1[:, j], bins=edges)[0], edges, fill=True, alpha=0.5, label='Biomass')
+            ax.stairs(np.histogram(a2[:, j], bins=edges)[0], edges, fill=True, alpha=0.5, label='Cellulose')
+            ax.set_title(r)
+            ax.legend()
+
+        fig.tight_layout()
+        st.pyplot(fig)
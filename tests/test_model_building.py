@@ -0,0 +1,46 @@
+import unittest
+from cobra.io import load_model
+from cobra.flux_analysis import single_gene_deletion
+from utils.model_building import get_removable_genes, get_essential_genes
+
+class TestModelBuilding(unittest.TestCase):
+
+    def setUp(self):
+        self.model = load_model('textbook')
+        # gapA is essential in the E. coli core model
+        self.lethal_gene = 'b1779'
+
+    def test_get_removable_genes_keeps_model_growing(self):
+        genes = sorted(g.id for g in self.model.genes)
+        removable_genes = get_removable_genes(self.model, genes, growth_threshold=1e-6)
+        self.assertTrue(removable_genes)
+        with self.model:
+            for g in removable_genes:
+                self.model.genes.get_by_id(g).knock_out()
+            self.assertGreater(self.model.slim_optimize(error_value=0.0), 1e-6)
+
+    def test_get_removable_genes_excludes_lethal_gene(self):
+        genes = [self.lethal_gene, 'b0008', 'b0114']
+        removable_genes = get_removable_genes(self.model, genes, growth_threshold=1e-6)
+        self.assertNotIn(self.lethal_gene, removable_genes)
+        self.assertIn('b0008', removable_genes)
+
+    def test_get_removable_genes_leaves_model_unchanged(self):
+        bounds = {r.id: r.bounds for r in self.model.reactions}
+        get_removable_genes(self.model, sorted(g.id for g in self.model.genes))
+        self.assertEqual(bounds, {r.id: r.bounds for r in self.model.reactions})
+
+    def test_get_essential_genes_uses_growth_threshold(self):
+        growth_threshold = 1e-6
+        essential_genes = get_essential_genes(self.model, growth_threshold)
+        deletion_results = single_gene_deletion(self.model)
+        expected = {
+            gene_id
+            for ids, growth in zip(deletion_results['ids'], deletion_results['growth'])
+            if not growth > growth_threshold
+            for gene_id in ids
+        }
+        self.assertIn(self.lethal_gene, essential_genes)
+        self.assertEqual(set(essential_genes), expected)
+        # Genes that only reduce growth are not essential
+        self.assertLess(len(essential_genes), len(self.model.genes))
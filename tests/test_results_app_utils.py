@@ -0,0 +1,90 @@
+import sys
+import types
+import unittest
+import importlib
+from unittest.mock import patch
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+stats = pytest.importorskip('scipy.stats')
+# Import the dependencies of results_app/utils.py up front, patch.dict would otherwise drop them from sys.modules
+pytest.importorskip('cobra.sampling')
+pytest.importorskip('matplotlib.pyplot')
+try:
+    import numba
+except ImportError:
+    pass
+
+def _import_results_app_utils():
+    """Import results_app/utils.py as results_app.utils, replacing streamlit with pass-through caching decorators if it is not installed."""
+    try:
+        import streamlit
+        modules = {}
+    except ImportError:
+        streamlit = types.ModuleType('streamlit')
+        streamlit.cache_data = lambda *args, **kwargs: (lambda f: f)
+        streamlit.cache_resource = lambda *args, **kwargs: (lambda f: f)
+        modules = {'streamlit': streamlit}
+    # The stub and the module imported with it are removed from sys.modules when leaving the context
+    with patch.dict(sys.modules, modules):
+        return importlib.import_module('results_app.utils')
+
+def _reference_statistics(a1, a2):
+    return np.array([stats.ks_2samp(a1[:, j], a2[:, j]).statistic for j in range(a1.shape[1])])
+
+class TestKSKernels(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.results_app_utils = _import_results_app_utils()
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Small integer samples of unequal size produce many ties within and across samples
+        self.tied_1 = rng.integers(0, 5, size=(300, 20)).astype(np.float64)
+        self.tied_2 = rng.integers(1, 6, size=(50, 20)).astype(np.float64)
+        self.float32_1 = rng.normal(size=(200, 10)).astype(np.float32)
+        self.float32_2 = rng.normal(0.3, size=(70, 10)).astype(np.float32)
+        self.kernels = [self.results_app_utils._ks_2samp_statistics]
+        if self.results_app_utils.numba is not None:
+            self.kernels.append(self.results_app_utils._ks_2samp_statistics_numba)
+
+    def test_kernels_match_scipy_with_ties(self):
+        expected = _reference_statistics(self.tied_1, self.tied_2)
+        for kernel in self.kernels:
+            np.testing.assert_allclose(kernel(self.tied_1, self.tied_2), expected, rtol=0, atol=1e-12)
+
+    def test_kernels_match_scipy_with_float32(self):
+        expected = _reference_statistics(self.float32_1, self.float32_2)
+        for kernel in self.kernels:
+            np.testing.assert_allclose(kernel(self.float32_1, self.float32_2), expected, rtol=0, atol=1e-12)
+
+    def test_kernels_without_columns(self):
+        for kernel in self.kernels:
+            self.assertEqual(kernel(self.tied_1[:, :0], self.tied_2[:, :0]).shape, (0,))
+
+class TestPerformKSTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.results_app_utils = _import_results_app_utils()
+
+    def test_perform_ks_test_matches_scipy(self):
+        rng = np.random.default_rng(1)
+        columns = list('abcde')
+        samples_1 = pd.DataFrame(rng.normal(size=(300, 5)).astype(np.float32), columns=columns)
+        samples_2 = pd.DataFrame(rng.normal(0.3, size=(50, 5)).astype(np.float32), columns=columns)
+        ks_df = self.results_app_utils.perform_ks_test(None, samples_1, samples_2)
+        self.assertEqual(ks_df['Reaction'].to_list(), columns)
+        for _, row in ks_df.iterrows():
+            expected = stats.ks_2samp(samples_1[row['Reaction']], samples_2[row['Reaction']], method='asymp')
+            self.assertAlmostEqual(row['Statistic'], expected.statistic, places=12)
+            self.assertAlmostEqual(row['P-value'], expected.pvalue, places=12)
+
+    def test_perform_ks_test_without_common_reactions(self):
+        samples_1 = pd.DataFrame({'a': [1.0, 2.0, 3.0]})
+        samples_2 = pd.DataFrame({'b': [1.0, 2.0]})
+        ks_df = self.results_app_utils.perform_ks_test(None, samples_1, samples_2)
+        self.assertTrue(ks_df.empty)
+        self.assertEqual(ks_df.columns.to_list(), ['Reaction', 'Statistic', 'P-value'])
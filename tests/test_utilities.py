@@ -1,7 +1,7 @@
 import os
 import gzip
 import unittest
-from utils.utilities import unzip_gzip_file
+from utils.utilities import unzip_gzip_file, get_tair_id_from_description
 
 class TestUtilities(unittest.TestCase):
 
@@ -23,4 +23,12 @@ class TestUtilities(unittest.TestCase):
 
         # Clean up the test files
         os.remove(test_gzip_file)
-        os.remove(unzipped_file)
\ No newline at end of file
+        os.remove(unzipped_file)
+
+    def test_get_tair_id_from_description(self):
+        description = 'lcl|NC_003070.9_prot_NP_171609.1_1 [gene=NAC001] [db_xref=Araport:AT1G01010,GeneID:839580,TAIR:AT1G01010] [protein=NAC domain containing protein 1]'
+        self.assertEqual(get_tair_id_from_description(description), 'AT1G01010')
+
+    def test_get_tair_id_from_description_without_tair(self):
+        description = 'lcl|NC_003070.9_prot_NP_171609.1_1 [gene=NAC001] [db_xref=GeneID:839580] [protein=TAIR:AT1G01010]'
+        self.assertIsNone(get_tair_id_from_description(description))
@@ -17,27 +17,22 @@ def download_file(url: str, directory: str, filename: str):
         None
 
     Raises:
-        None
+        requests.HTTPError: If the request fails.
 
     Prints:
         - "File downloaded successfully: {filepath}" if the file is downloaded successfully.
-        - "Failed to download the file. Status code: {response.status_code}" if the request fails.
     """
     # Create the directory if it doesn't exist
     check_directory_existence(directory)
 
-    # Send a GET request to the URL
-    response = requests.get(url)
-
-    # Check if the request was successful
-    if response.status_code == 200:
-        # Save the response content to a file in the directory
-        filepath = os.path.join(directory, filename)
+    # Stream the response to the file in the directory instead of holding it in memory
+    filepath = os.path.join(directory, filename)
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
         with open(filepath, "wb") as file:
-            file.write(response.content)
-        print(f"File downloaded successfully: {filepath}")
-    else:
-        print(f"Failed to download the file. Status code: {response.status_code}")
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                file.write(chunk)
+    print(f"File downloaded successfully: {filepath}")
 
 def load_arabidopsis_model(path: str='../models/arabidopsis_model.xml') -> cobra.Model:
     """
@@ -64,7 +59,7 @@ def get_proteome(url:str, directory:str,filename:str):
         None
 
     Raises:
-        None
+        requests.HTTPError: If the download request fails.
     """
     download_file(url, directory, filename)
     zip_filepath = os.path.join(directory, filename)
@@ -2,12 +2,35 @@ import os
 import pandas as pd
 from utils.utilities import get_tair_id_from_description
 from utils.data_io import load_arabidopsis_model
-from Bio import SeqIO
+from Bio.SeqIO.FastaIO import SimpleFastaParser
 
 import cobra
 from cobra.manipulation.delete import remove_genes
 from cobra.flux_analysis import single_gene_deletion, double_gene_deletion
 
+try:
+    import pyfastx
+except ImportError:
+    pyfastx = None
+
+def _iter_fasta_headers(fasta_path: str):
+    """
+    Iterate over the headers of a FASTA file, using the pyfastx C parser when it is installed and Biopython's SimpleFastaParser otherwise.
+
+    Args:
+        fasta_path (str): The path to the FASTA file.
+
+    Yields:
+        tuple: The sequence identifier and the full description line of each record.
+    """
+    if pyfastx is not None:
+        for name, _, comment in pyfastx.Fastx(fasta_path, comment=True):
+            yield name, f"{name} {comment}" if comment else name
+    else:
+        with open(fasta_path) as handle:
+            for title, _ in SimpleFastaParser(handle):
+                yield title.split(None, 1)[0], title
+
 def get_model_gene_to_proteome_map(arabidopsis_proteome: str, diamond_mapping: pd.DataFrame) -> dict:
     """
     Get a mapping of Arabidopsis thaliana model genes to protein identifiers from the proteome.
@@ -21,11 +44,9 @@ def get_model_gene_to_proteome_map(arabidopsis_proteome: str, diamond_mapping: p
             The keys are the model gene IDs and the values are the corresponding protein identifiers.
     """
     # Map the Arabidopsis thaliana model genes to protein identifiers from the proteome
-    records = SeqIO.parse(arabidopsis_proteome, 'fasta')
-    genome_to_model_mapping = {i.id: get_tair_id_from_description(i.description)for i in records.records}
+    genome_to_model_mapping = {seq_id: get_tair_id_from_description(description) for seq_id, description in _iter_fasta_headers(arabidopsis_proteome)}
     # Use this mapping to add a column to the dataframe
-    tair_col = [genome_to_model_mapping.get(i) for i in diamond_mapping.sseqid]
-    diamond_mapping['TAIR_ID'] = tair_col
+    diamond_mapping['TAIR_ID'] = diamond_mapping['sseqid'].map(genome_to_model_mapping)
     return diamond_mapping
 
 
@@ -43,31 +64,50 @@ def get_model_genes_to_remove(diamond_mapping: pd.DataFrame, model: cobra.Model,
         list: A list of genes that should be removed from the reference model.
     """
     # The non redundant list of TAIR IDs in the diamond_mapping is a list that can be mapped to the A. thaliana model to produce a reduced version of it
-    target_genes = list(set(diamond_mapping['TAIR_ID'].drop_duplicates().dropna().to_list()))
+    target_genes = frozenset(diamond_mapping['TAIR_ID'].dropna().unique())
     if verbose:
         print(f"{len(target_genes)} target species genes were found in the reference proteome")
-    # Now map those genes to the model
-    target_model_genes = [g.id for g in model.genes if g.id in target_genes]
+    # Now map those genes to the model with set operations on the gene identifiers
+    model_genes = {g.id: g for g in model.genes}
+    remove_ids = model_genes.keys() - target_genes
     if verbose:
-        print(f"{len(target_model_genes)} target species were found in the reference model containing {len(model.genes)}")
-    genes_to_remove = [g for g in model.genes if g.id not in target_model_genes]
+        print(f"{len(model_genes) - len(remove_ids)} target species were found in the reference model containing {len(model.genes)}")
+    # Keep the model order so that the result does not depend on set iteration order
+    genes_to_remove = [g for gene_id, g in model_genes.items() if gene_id in remove_ids]
     if verbose:
         print(f"{len(genes_to_remove)} genes must be removed from the reference model")
     return genes_to_remove
 
-def get_essential_genes(model: cobra.Model) -> list:
+def _pick_processes(n_tasks: int) -> int:
+    """
+    Choose the number of processes for a batch of gene deletions.
+    Small batches run serially since starting the worker pool would cost more than the deletions themselves.
+
+    Args:
+        n_tasks (int): The number of deletions to simulate.
+
+    Returns:
+        int: The number of processes to use.
+    """
+    if n_tasks < 100:
+        return 1
+    return max(1, min(os.cpu_count() or 1, n_tasks // 25))
+
+def get_essential_genes(model: cobra.Model, growth_threshold: float=1e-6) -> list:
     """
     A wrapper around the single gene deletion function from Cobra.
     Returns a list of essential genes. The elements of that list are the genes identifier as strings.
 
     Args:
         model (cobra.Model): The model from which the essential genes will be extracted.
+        growth_threshold (float, optional): The growth at or below which a deletion is considered lethal, infeasible deletions are always lethal. Defaults to 1e-6.
 
     Returns:
         list: A list of essential genes.
     """
-    deletion_results = single_gene_deletion(model)
-    essential_genes = [list(i)[0] for i in deletion_results[deletion_results['growth'] != 10]['ids'].to_list()]
+    deletion_results = single_gene_deletion(model, method='fba', processes=_pick_processes(len(model.genes)))
+    lethal = deletion_results['growth'].fillna(0.0) <= growth_threshold
+    essential_genes = deletion_results.loc[lethal, 'ids'].explode().dropna().unique().tolist()
     return essential_genes
 
 def get_exchange_genes(model):
@@ -80,48 +120,79 @@ def get_exchange_genes(model):
     Returns:
         list: A list of gene IDs that are involved in exchange reactions.
     """
-    exchange_genes = []
-    for r in model.exchanges:
-        exchange_genes.append([g.id for g in r.genes])
-
-    exchange_genes = list(set([i for l in exchange_genes for i in l]))
+    exchange_genes = list({g.id for r in model.exchanges for g in r.genes})
     return exchange_genes
 
-def get_synthetic_lethals(model: cobra.Model, genes_to_remove: list) -> list:
+def get_synthetic_lethals(model: cobra.Model, genes_to_remove: list, growth_threshold: float=1e-6) -> list:
     """
     Given a `cobra.Model` `model` and a list of `genes_to_remove`, this function returns a list of gene IDs that are synthetic lethal to the model when both `gene_list1` and `gene_list2` are set to `genes_to_remove`.
 
     Args:
         model (cobra.Model): The model from which synthetic lethal genes will be identified.
         genes_to_remove (list): A list of gene IDs to be removed from the model.
+        growth_threshold (float, optional): The growth at or below which a deletion is considered lethal, infeasible deletions are always lethal. Defaults to 1e-6.
 
     Returns:
         list: A list of gene IDs that are synthetic lethal to the model when both `gene_list1` and `gene_list2` are set to `genes_to_remove`.
     """
-    synthetic_lethals = double_gene_deletion(model, gene_list1=genes_to_remove, gene_list2=genes_to_remove)
-    l = [i for s in synthetic_lethals[synthetic_lethals['growth']!=10]['ids'] for i in list(s)]
-    return l
+    synthetic_lethals = double_gene_deletion(model, gene_list1=genes_to_remove, gene_list2=genes_to_remove, method='fba', processes=_pick_processes(len(genes_to_remove) ** 2))
+    lethal = synthetic_lethals['growth'].fillna(0.0) <= growth_threshold
+    return synthetic_lethals.loc[lethal, 'ids'].explode().dropna().unique().tolist()
 
-def prune_genes_to_remove(model: cobra.Model, genes_to_remove: list) -> list:
+def get_removable_genes(model: cobra.Model, genes_to_remove: list, growth_threshold: float=1e-6) -> list:
     """
-    Prunes the list of genes to remove from a given model by excluding essential genes and genes from exchange reactions.
+    Given a `cobra.Model` `model` and a list of `genes_to_remove`, this function returns the genes that can be knocked out together while the model still grows.
+    All the genes are first knocked out at once, if the model no longer grows the list is split in halves and each half is tested recursively,
+    the second half being tested with the removable genes of the first half already knocked out.
+
+    Args:
+        model (cobra.Model): The model from which genes will be removed. The model is left unchanged.
+        genes_to_remove (list): A list of gene IDs to be removed from the model.
+        growth_threshold (float, optional): The objective value above which the model is considered to grow. Defaults to 1e-6.
+
+    Returns:
+        list: A list of gene IDs that can be removed together from the model.
+    """
+    genes_to_remove = list(genes_to_remove)
+    if not genes_to_remove:
+        return []
+    with model:
+        for g in genes_to_remove:
+            model.genes.get_by_id(g).knock_out()
+        growth = model.slim_optimize(error_value=0.0)
+    if growth > growth_threshold:
+        return genes_to_remove
+    if len(genes_to_remove) == 1:
+        return []
+    half = len(genes_to_remove) // 2
+    removable_genes = get_removable_genes(model, genes_to_remove[:half], growth_threshold)
+    with model:
+        for g in removable_genes:
+            model.genes.get_by_id(g).knock_out()
+        removable_genes += get_removable_genes(model, genes_to_remove[half:], growth_threshold)
+    return removable_genes
+
+def prune_genes_to_remove(model: cobra.Model, genes_to_remove: list, growth_threshold: float=1e-6) -> list:
+    """
+    Prunes the list of genes to remove from a given model by excluding essential genes, genes from exchange reactions and genes that prevent the model from growing in combination.
     
     Args:
         model (cobra.Model): The model from which genes will be pruned.
         genes_to_remove (list): A list of gene IDs to be removed from the model.
+        growth_threshold (float, optional): The objective value above which the model is considered to grow. Defaults to 1e-6.
         
     Returns:
         list: A list of gene IDs that can be safely removed from the model.
     """
     # Identify the essential genes in this model
-    essential_genes = get_essential_genes(model)
+    essential_genes = get_essential_genes(model, growth_threshold)
     # Edit the genes to remove to avoid removing essential genes that will prevent the model from solving
     genes_to_remove = set([g.id for g in genes_to_remove]) - set(essential_genes)
     # Do not remove the genes from the exchange reactions either
     exchanges_genes = get_exchange_genes(model)
     genes_to_remove = set(genes_to_remove) - set(exchanges_genes)
-    synthetic_lethals = get_synthetic_lethals(model, genes_to_remove)
-    genes_to_remove = set(genes_to_remove) - set(synthetic_lethals)
+    # Only keep the genes that can be removed together, this takes O(k log k) optimizations instead of the O(k^2) of double deletions
+    genes_to_remove = set(get_removable_genes(model, sorted(genes_to_remove), growth_threshold))
     return genes_to_remove
 
 def generate_base_model(genes_to_remove: list, save_path: str, model: cobra.Model=None):
@@ -142,8 +213,8 @@ def generate_base_model(genes_to_remove: list, save_path: str, model: cobra.Mode
 
     remove_genes(model, genes_to_remove, remove_reactions=True)
 
-    # It is safer to save the model
-    cobra.io.save_json_model(model, save_path)
+    # It is safer to save the model, compact and unsorted JSON keeps the serialization cheap for large models
+    cobra.io.save_json_model(model, save_path, pretty=False, sort=False)
 
 def gapfill_base_model(infile: str, outfile: str):
     """
@@ -159,11 +230,13 @@ def gapfill_base_model(infile: str, outfile: str):
     model = load_arabidopsis_model()
     base_model = cobra.io.load_json_model(infile)
     print("Loaded both models, now checking reactions one at a time")
+    base_reaction_ids = {react.id for react in base_model.reactions}
     for r in model.reactions:
-        if r.id not in [react.id for react in base_model.reactions]:
+        if r.id not in base_reaction_ids:
             # base_model = cobra.io.load_json_model(os.path.join('./models','hirsutum_base_model.json'))
             # print(f"Loaded the model for {r.id}")
             base_model.add_reactions([r])
+            base_reaction_ids.add(r.id)
             solution = base_model.optimize()
             if not solution.status == 'infeasible':
                 print(f"Added {r.id} and it solves the model with value {solution.objective_value}")
@@ -1,6 +1,10 @@
 import gzip
 import os
 import re
+import shutil
+
+_BRACKET_RE = re.compile(r'\[([^\]]*)\]')
+_TAIR_RE = re.compile(r'\[db_xref=(?:[^\],]*,)*TAIR:(?:[^,\]]*:)?([^,\]:]*)')
 
 def check_directory_existence(directory_path):
     """
@@ -12,10 +16,10 @@ def check_directory_existence(directory_path):
     Returns:
     None
     """
-    if not os.path.exists(directory_path):
+    try:
         os.makedirs(directory_path)
         print(f"Directory '{directory_path}' created successfully.")
-    else:
+    except FileExistsError:
         print(f"Directory '{directory_path}' already exists.")
 
 def unzip_gzip_file(zipped_file_path: str, unzipped_filepath: str):
@@ -29,9 +33,10 @@ def unzip_gzip_file(zipped_file_path: str, unzipped_filepath: str):
     Returns:
         None
     """
+    # Decompress in 1 MiB chunks so that memory use does not depend on the file size
     with gzip.open(zipped_file_path, 'rb') as gz_file:
         with open(unzipped_filepath, 'wb') as output_file:
-            output_file.write(gz_file.read())
+            shutil.copyfileobj(gz_file, output_file, length=1 << 20)
 
 
 
@@ -45,16 +50,14 @@ def find_elements_between(text: str):
     Returns:
         list: A list of all elements found between square brackets in the text.
     """
-    pattern = r'\[(.*?)\]'
-    matches = re.findall(pattern, text)
-    return matches
+    return _BRACKET_RE.findall(text)
 
 def get_tair_id_from_description(description: str):
     """
-    Given a description string, this function searches for elements enclosed in square brackets and 
-    checks if any of the elements start with 'db_xref='. If such an element is found, it splits the 
-    element by '=' and then by ',' to get a list of cross references. It then checks if any of the 
-    cross references start with 'TAIR:' and if so, it returns the ID after the ':' character. 
+    Given a description string, this function searches for an element enclosed in square brackets that 
+    starts with 'db_xref=' and holds a comma separated cross reference starting with 'TAIR:'. If such a 
+    cross reference is found, it returns the ID after the ':' character. A single precompiled regular 
+    expression performs the whole search.
 
     Args:
         description (str): The input string from which to extract the TAIR ID.
@@ -62,10 +65,8 @@ def get_tair_id_from_description(description: str):
     Returns:
         str or None: The TAIR ID if found, or None if no TAIR ID is found.
     """
-    descriptors = find_elements_between(description)
-    for i in descriptors:
-        if i.startswith('db_xref='):
-            cross_references = i.split('=')[-1].split(',')
-            for j in cross_references:
-                if j.startswith('TAIR:'):
-                    return j.split(':')[-1]
+    # Most headers carry no TAIR cross reference, a substring test rejects them before running the regex
+    if 'TAIR:' not in description:
+        return None
+    match = _TAIR_RE.search(description)
+    return match.group(1) if match else None